@@ -1,8 +1,5 @@
-import pygame
 from pathlib import Path
 import sys
-import librosa
-import time
 
 class ProjectPaths:
   def __init__(self):
@@ -17,10 +14,14 @@ class ProjectPaths:
     self.recordings_dir.mkdir(exist_ok=True)
     self.cache_dir.mkdir(exist_ok=True)
 
-    self.sample_rate = 44100
-    pygame.mixer.init(frequency=self.sample_rate, size=-16, channels=2)
+def _ensure_mixer(frequency=44100):
+  import pygame
+  if not pygame.mixer.get_init():
+    pygame.mixer.init(frequency=frequency, size=-16, channels=2)
 
 def main():
+  import pygame
+
   print("Script to play song is called!!!!!!!!!!!!!!!")
 
   paths = ProjectPaths()
@@ -46,12 +47,15 @@ def main():
     sys.exit(1)
 
   instrumental_path = songs[song_key]["instrumental"]
-  duration = librosa.get_duration(path=str(instrumental_path))
 
-  pygame.mixer.music.load(str(instrumental_path))
-  pygame.mixer.music.play()
+  _ensure_mixer()
+  instrumental = pygame.mixer.Sound(str(instrumental_path))
+  print(f"Song duration: {instrumental.get_length():.1f} seconds")
+  channel = instrumental.play()
 
-  time.sleep(int(duration))
+  # Poll until the whole track has played instead of sleeping a truncated duration
+  while channel.get_busy():
+    pygame.time.wait(50)
 
   pygame.mixer.quit()
   pygame.quit()
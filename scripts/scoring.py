@@ -1,50 +1,242 @@
-import librosa
 import numpy as np
-import sounddevice as sd
 import soundfile as sf
-import pygame
 import time
-import os
-import pickle
-from pathlib import Path
-from scipy.signal import savgol_filter
-from fastdtw import fastdtw
-from scipy.spatial.distance import euclidean
-from numpy.fft import rfft, irfft
+import hashlib
 import multiprocessing
-from functools import partial
+import signal
+from pathlib import Path
+from numba import njit
 
+# librosa, sounddevice, pygame and scipy are imported where they are used:
+# together they take seconds to import and not every code path needs them.
+
+@njit(cache=True, fastmath=True, inline='always')
 def circular_semitone_distance(a, b):
     """
     Measures distance between two MIDI notes in circular semitone space
-    (12 semitones = 0 distance).
+    (12 semitones = 0 distance), always within [0, 6]. Smoothing can push
+    folded curves slightly outside 60-72, so the difference is wrapped first.
+    Branchless, so it works elementwise on arrays as well as on scalars
+    inside other kernels.
+    """
+    diff = np.abs(a - b) % 12.0
+    return np.minimum(diff, 12.0 - diff)
+
+@njit(cache=True, fastmath=True)
+def f0_to_norm_midi(f0, out):
+    """
+    Converts f0 (Hz) to MIDI folded into the octave starting at middle C
+    (60-72) in a single pass, writing into `out`. Unvoiced frames stay 0.
     """
-    diff = abs(a - b)
-    return min(diff, 12 - diff)
+    for i in range(f0.size):
+        v = f0[i]
+        out[i] = 0.0 if v <= 0 else ((12.0 * np.log2(v / 440.0) + 69.0 - 60.0) % 12.0) + 60.0
 
-def process_audio_chunk(chunk, sr, frame_length, hop_length):
-    """Process a single audio chunk for pitch detection."""
-    rms = librosa.feature.rms(y=chunk, frame_length=frame_length, hop_length=hop_length)[0]
+@njit(cache=True, fastmath=True)
+def fold_midi_to_octave(midi_notes, out):
+    """
+    Folds MIDI notes into the octave starting at middle C (60-72) in a single
+    pass, writing into `out`. Silent frames (0) stay 0.
+    """
+    for i in range(midi_notes.size):
+        v = midi_notes[i]
+        out[i] = 0.0 if v == 0 else ((v - 60.0) % 12.0) + 60.0
+
+def decimate_mean(x, target):
+    """
+    Block-averages an octave-folded (60-72) MIDI curve down to `target` points.
+    The mean is taken on the pitch circle so blocks straddling 72 -> 60 wrap
+    correctly instead of averaging to the middle of the octave. Block edges
+    are proportional, so every frame lands in a block.
+    """
+    edges = np.linspace(0, len(x), target + 1).astype(np.intp)[:-1]
+    angles = (np.asarray(x, dtype=np.float32) - 60.0) * np.float32(2 * np.pi / 12)
+    # Sums rather than means: atan2 only needs the direction
+    mean_angle = np.arctan2(np.add.reduceat(np.sin(angles), edges),
+                            np.add.reduceat(np.cos(angles), edges))
+    return (60.0 + np.mod(mean_angle * np.float32(12 / (2 * np.pi)), 12.0)).astype(np.float32)
+
+@njit(cache=True, fastmath=True)
+def smooth_voiced_frames(midi_notes, out):
+    """
+    Per voiced segment savgol_filter(seg, 5, 2) in its default 'interp' mode,
+    writing into `out`: 5-point coefficients [-3, 12, 17, 12, -3] / 35 inside
+    the segment and the order-2 fit of its first/last five frames at the two
+    frames on each edge. Segments shorter than 7 frames keep their raw pitch
+    (their window would shrink to 3, which an order-2 fit leaves unchanged);
+    silent frames stay 0.
+    """
+    n = midi_notes.size
+    start = 0
+    while start < n:
+        if midi_notes[start] == 0:
+            out[start] = midi_notes[start]
+            start += 1
+            continue
+        end = start
+        while end < n and midi_notes[end] != 0:
+            end += 1
+        if end - start < 7:
+            for i in range(start, end):
+                out[i] = midi_notes[i]
+        else:
+            for i in range(start + 2, end - 2):
+                out[i] = (17.0 * midi_notes[i]
+                          + 12.0 * (midi_notes[i - 1] + midi_notes[i + 1])
+                          - 3.0 * (midi_notes[i - 2] + midi_notes[i + 2])) / 35.0
+            h = midi_notes[start:start + 5]
+            out[start] = (31.0 * h[0] + 9.0 * h[1] - 3.0 * h[2] - 5.0 * h[3] + 3.0 * h[4]) / 35.0
+            out[start + 1] = (9.0 * h[0] + 13.0 * h[1] + 12.0 * h[2] + 6.0 * h[3] - 5.0 * h[4]) / 35.0
+            t = midi_notes[end - 5:end]
+            out[end - 1] = (31.0 * t[4] + 9.0 * t[3] - 3.0 * t[2] - 5.0 * t[1] + 3.0 * t[0]) / 35.0
+            out[end - 2] = (9.0 * t[4] + 13.0 * t[3] + 12.0 * t[2] + 6.0 * t[1] - 5.0 * t[0]) / 35.0
+        start = end
+
+@njit(cache=True, fastmath=True)
+def dtw_distance(a, b, radius, out=None):
+    """
+    Exact DTW distance between two 1-D MIDI curves with the circular semitone
+    distance as local cost. A radius of max(len(a), len(b)) or more, which is
+    what scoring passes, is plain unconstrained DTW: what fastdtw approximates
+    (its radius refines a coarse path, it is not a hard band). A smaller radius
+    limits warping to a Sakoe-Chiba band of that half-width. Only two rolling
+    rows are kept: O(radius * len(a)) time and O(radius) memory. `out` is an
+    optional float32 scratch buffer reused across calls when it is at least
+    (2, 2 * radius + 1).
+    """
+    n = a.shape[0]
+    m = b.shape[0]
+    radius = min(max(radius, abs(n - m)), max(n, m))
+    width = 2 * radius + 1
+    big = np.float32(1e30)
+
+    if out is None or out.shape[0] < 2 or out.shape[1] < width:
+        rows = np.empty((2, width), dtype=np.float32)
+    else:
+        rows = out
+    # Slot k of a row holds the accumulated cost of cell (i, j) with j = i + k - radius
+    prev = rows[0, :width]
+    curr = rows[1, :width]
+    prev[:] = big
+    prev[radius] = 0.0
+
+    for i in range(1, n + 1):
+        j_start = max(1, i - radius)
+        j_end = min(m, i + radius)
+        # Only the slots just outside [j_start, j_end] are read without being
+        # written this row (here, and as the previous row on the next one)
+        k_start = j_start - i + radius
+        k_end = j_end - i + radius
+        if k_start > 0:
+            curr[k_start - 1] = big
+        if k_end + 1 < width:
+            curr[k_end + 1] = big
+        for j in range(j_start, j_end + 1):
+            k = j - i + radius
+            d = circular_semitone_distance(a[i - 1], b[j - 1])
+            best = prev[k]
+            if k + 1 < width and prev[k + 1] < best:
+                best = prev[k + 1]
+            if k > 0 and curr[k - 1] < best:
+                best = curr[k - 1]
+            curr[k] = d + best
+        prev, curr = curr, prev
+
+    return prev[m - n + radius]
+
+def warm_up_kernels():
+    """
+    Calls each numba kernel once on a tiny input with the dtypes used for
+    scoring, so compilation (or loading the on-disk cache) happens up front
+    rather than during the first score.
+    """
+    x = np.linspace(60.0, 71.0, 16).astype(np.float32)
+    f0_to_norm_midi(x, np.empty_like(x))
+    smooth_voiced_frames(x, np.empty_like(x))
+    dtw_distance(x, x, 2, np.empty((2, 5), dtype=np.float32))
+
+def _ensure_mixer(frequency=44100):
+    """Initializes the pygame mixer unless it is already running."""
+    import pygame
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=frequency, size=-16, channels=2)
+
+def load_audio(path, sample_rate, duration=None):
+    """
+    Decodes `path` to mono float32 at `sample_rate`, reading at most `duration`
+    seconds. Resamples with soxr only when the file rate differs.
+    """
+    with sf.SoundFile(str(path)) as f:
+        file_rate = f.samplerate
+        frames = -1 if duration is None else int(duration * file_rate)
+        audio = f.read(frames, dtype='float32', always_2d=True)
+
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    if file_rate != sample_rate:
+        import soxr
+        audio = soxr.resample(audio, file_rate, sample_rate, 'HQ')
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def resolve_pitch_backend(backend):
+    """Returns `backend` if it can run here, falling back to pyin otherwise."""
+    if backend == 'world':
+        try:
+            import pyworld
+        except ImportError:
+            print("pyworld is not installed - falling back to pyin")
+            return 'pyin'
+    elif backend != 'pyin':
+        raise ValueError(f"Unknown pitch backend: {backend}")
+    return backend
+
+def _world_f0(audio, sr, frame_length, hop_length, n_frames):
+    """WORLD DIO + StoneMask f0 on the same frame grid as pyin with center=False."""
+    import pyworld
+
+    # Dropping half a frame puts DIO's frame t=0 on the centre of pyin's first frame
+    x = np.ascontiguousarray(audio[frame_length // 2:], dtype=np.float64)
+    f0, t = pyworld.dio(x, sr, f0_floor=65.4, f0_ceil=523.25,
+                        frame_period=1000.0 * hop_length / sr)
+    f0 = pyworld.stonemask(x, f0, t, sr)[:n_frames]
+    return np.pad(f0, (0, n_frames - len(f0)))
+
+def detect_pitch(audio, sr, frame_length, hop_length, backend='pyin'):
+    """Run pitch detection over a whole signal in a single pass of `backend`."""
+    import librosa
+
+    # Shorter than one frame: no frames to analyse, same shape as the failure path
+    if len(audio) < frame_length:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
+
+    # Same framing as pyin with center=False; the strided view avoids a copy
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame_length)[::hop_length]
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_length)
     energy_threshold = np.mean(rms) * 0.02
 
     try:
-        f0, voiced_flag, _ = librosa.pyin(
-            chunk,
-            fmin=65.4,
-            fmax=523.25,
-            sr=sr,
-            frame_length=frame_length,
-            hop_length=hop_length,
-            fill_na=0.0
-        )
+        if backend == 'world':
+            f0 = _world_f0(audio, sr, frame_length, hop_length, len(rms))
+            voiced_flag = f0 > 0
+        else:
+            f0, voiced_flag, _ = librosa.pyin(
+                audio,
+                fmin=65.4,
+                fmax=523.25,
+                sr=sr,
+                frame_length=frame_length,
+                hop_length=hop_length,
+                center=False,
+                fill_na=0.0
+            )
     except Exception:
-        return np.zeros_like(rms), np.zeros_like(rms, dtype=bool)
+        return np.zeros_like(rms, dtype=np.float32), np.zeros_like(rms, dtype=bool)
 
+    f0 = f0.astype(np.float32, copy=False)
     if len(rms) != len(f0):
         rms = librosa.util.fix_length(rms, len(f0))
 
     energy_mask = rms > energy_threshold
-    f0 = np.where(energy_mask & voiced_flag, f0, 0.0)
+    f0 = np.where(energy_mask & voiced_flag, f0, np.float32(0))
     return f0, voiced_flag
 
 class ProjectPaths:
@@ -70,13 +262,21 @@ class ProjectPaths:
         return self.recordings_dir / f"recording_{timestamp}.wav"
 
 class ReferenceCache:
-    def __init__(self, cache_dir):
+    CACHED_KEYS = ('ref_f0', 'ref_midi', 'ref_midi_norm', 'ref_midi_smooth')
+
+    def __init__(self, cache_dir, analysis_params=()):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
+        self.analysis_params = tuple(analysis_params)
         
     def _get_cache_path(self, reference_path):
-        reference_filename = Path(reference_path).stem
-        cache_path = self.cache_dir / f"{reference_filename}_cache.pkl"
+        # Keyed on file stats and analysis settings so edits to the reference
+        # or to the pitch framing never hit a stale cache.
+        reference_path = Path(reference_path)
+        stat = reference_path.stat()
+        key = repr((stat.st_mtime, stat.st_size, reference_path.name, self.analysis_params))
+        digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+        cache_path = self.cache_dir / f"{reference_path.stem}_{digest}_cache.npz"
         print(f"Cache path: {cache_path}")
         return cache_path
     
@@ -85,10 +285,10 @@ class ReferenceCache:
         if cache_path.exists():
             print(f"Found existing cache file")
             try:
-                with open(cache_path, 'rb') as f:
-                    cached_data = pickle.load(f)
-                    print("Successfully loaded cached analysis")
-                    return cached_data
+                with np.load(cache_path, allow_pickle=False) as f:
+                    cached_data = {key: f[key] for key in self.CACHED_KEYS}
+                print("Successfully loaded cached analysis")
+                return cached_data
             except Exception as e:
                 print(f"Error loading cache: {e}")
                 return None
@@ -100,120 +300,157 @@ class ReferenceCache:
         cache_path = self._get_cache_path(reference_path)
         print(f"Caching analysis for {reference_path}")
         try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(analysis_data, f)
+            np.savez(
+                cache_path,
+                **{key: np.asarray(analysis_data[key], dtype=np.float32)
+                   for key in self.CACHED_KEYS}
+            )
         except Exception as e:
             print(f"Error saving cache: {e}")
 
 class KaraokeScorer:
-    def __init__(self, vocals_path, instrumental_path, project_paths):
+    def __init__(self, vocals_path, instrumental_path, project_paths, pitch_backend='pyin'):
         self.sample_rate = 44100
+        self.pitch_backend = resolve_pitch_backend(pitch_backend)
         self.instrumental_path = instrumental_path
         self.vocals_path = vocals_path
         self.project_paths = project_paths
         
-        self.frame_length = 2048
-        self.hop_length = self.frame_length // 4
+        # Two periods of the 65.4 Hz pyin floor need ~1350 samples at 44.1 kHz;
+        # the hop stays at 512 so frame-based constants keep their meaning.
+        self.frame_length = 1536
+        self.hop_length = 512
+
+        # Curves longer than dtw_max_points are decimated to it, so DTW cost is
+        # bounded and the scratch rows are allocated once. DTW is unconstrained
+        # to keep the scores of fastdtw: a Sakoe-Chiba band penalises tempo
+        # drift and offsets that the xcorr shift does not remove.
+        self.dtw_max_points = 1000
+        self._dtw_rows = np.empty((2, 2 * self.dtw_max_points + 1), dtype=np.float32)
+        self._perf_midi_shifted = None
         
-        duration = librosa.get_duration(path=str(instrumental_path))
+        duration = sf.info(str(instrumental_path)).duration
         self.record_duration = int(duration)
         print(f"Song duration: {self.record_duration} seconds")
         
-        pygame.mixer.init(frequency=self.sample_rate, size=-16, channels=2)
-        self.cache = ReferenceCache(project_paths.cache_dir)
+        _ensure_mixer(self.sample_rate)
+        self.cache = ReferenceCache(
+            project_paths.cache_dir,
+            analysis_params=(
+                self.sample_rate, self.frame_length, self.hop_length, self.record_duration,
+                self.pitch_backend
+            )
+        )
         
+        self._ref_process = None
+        self._ref_conn = None
         cached_data = self.cache.get_cached_analysis(vocals_path)
         if cached_data:
             self._load_cached_data(cached_data)
         else:
-            self._analyze_reference_vocals()
+            self._start_reference_analysis()
+
+        warm_up_kernels()
     
     def _load_cached_data(self, cached_data):
-        self.reference_audio = cached_data['reference_audio']
-        self.ref_f0 = cached_data['ref_f0']
-        self.ref_midi = cached_data['ref_midi']
-        self.ref_midi_norm = cached_data['ref_midi_norm']
-        self.ref_midi_smooth = cached_data['ref_midi_smooth']
+        self._set_reference_data(cached_data)
         print("Successfully loaded cached reference analysis")
+
+    def _set_reference_data(self, reference_data):
+        self.ref_f0 = reference_data['ref_f0']
+        self.ref_midi = reference_data['ref_midi']
+        self.ref_midi_norm = reference_data['ref_midi_norm']
+        self.ref_midi_smooth = reference_data['ref_midi_smooth']
         
-    def _analyze_reference_vocals(self):
-        print("Loading reference vocals...")
-        self.reference_audio, _ = librosa.load(
+    def _reference_analysis_args(self):
+        return (
             str(self.vocals_path),
-            sr=self.sample_rate,
-            duration=self.record_duration,
-            mono=True
+            self.sample_rate,
+            self.record_duration,
+            self.frame_length,
+            self.hop_length,
+            self.pitch_backend,
+            self.cache
         )
 
-        print("Analyzing reference pitch...")
-        chunk_size = self.sample_rate * 10
-        chunks = [self.reference_audio[i:i + chunk_size] 
-                 for i in range(0, len(self.reference_audio), chunk_size)]
-
-        with multiprocessing.Pool() as pool:
-            process_chunk = partial(
-                process_audio_chunk,
-                sr=self.sample_rate,
-                frame_length=self.frame_length,
-                hop_length=self.hop_length
-            )
-            results = pool.map(process_chunk, chunks)
-
-        self.ref_f0 = np.concatenate([r[0] for r in results])
-        self.ref_midi = self.convert_to_midi(self.ref_f0)
-        self.ref_midi_norm = self.normalize_to_octave(self.ref_midi)
-        self.ref_midi_smooth = self.get_smooth_pitch_curve(self.ref_midi_norm)
-        
-        cache_data = {
-            'reference_audio': self.reference_audio,
-            'ref_f0': self.ref_f0,
-            'ref_midi': self.ref_midi,
-            'ref_midi_norm': self.ref_midi_norm,
-            'ref_midi_smooth': self.ref_midi_smooth
-        }
-        self.cache.cache_analysis(self.vocals_path, cache_data)
-        
-        print("Reference analysis complete and cached")
+    def _start_reference_analysis(self):
+        # Runs in a worker process so it overlaps the countdown and recording
+        # without competing with the audio callback for the GIL. The worker is
+        # spawned rather than forked: forking once numba's threads are running
+        # hangs at exit. It ignores SIGINT, so Ctrl-C cancels the recording,
+        # not the analysis, and it is a daemon, so exit never waits on it.
+        context = multiprocessing.get_context('spawn')
+        self._ref_conn, send_conn = context.Pipe(duplex=False)
+        self._ref_process = context.Process(
+            target=_reference_analysis_worker,
+            args=(send_conn,) + self._reference_analysis_args(),
+            daemon=True
+        )
+        self._ref_process.start()
+        send_conn.close()
+
+    def _wait_for_reference_analysis(self):
+        if self._ref_process is None:
+            return
+        process, self._ref_process = self._ref_process, None
+        conn, self._ref_conn = self._ref_conn, None
+        if not conn.poll():
+            print("Waiting for reference analysis to finish...")
+        try:
+            reference_data, error = conn.recv()
+        except EOFError:
+            reference_data, error = None, f"worker exited with code {process.exitcode}"
+        finally:
+            conn.close()
+            process.join()
+        if error is not None:
+            print(f"Background reference analysis failed ({error}) - analyzing in-process")
+            reference_data = analyze_reference_vocals(*self._reference_analysis_args())
+        self._set_reference_data(reference_data)
         print(f"Reference f0 non-zero frames: {np.count_nonzero(self.ref_f0)}")
         print(f"Reference MIDI non-zero frames: {np.count_nonzero(self.ref_midi)}")
 
-    def convert_to_midi(self, f0):
-        return np.where(f0 > 0, librosa.hz_to_midi(f0), 0)
+    def close(self):
+        """Stops a reference analysis that is still running, for when no score will be computed."""
+        process, self._ref_process = self._ref_process, None
+        if process is None:
+            return
+        if process.is_alive():
+            print("Stopping reference analysis...")
+            # The worker ignores SIGINT, so it has to be terminated
+            process.terminate()
+        process.join()
+        self._ref_conn.close()
+        self._ref_conn = None
+
+    @staticmethod
+    def convert_to_midi(f0):
+        f0 = np.asarray(f0, dtype=np.float32)
+        midi = np.zeros_like(f0)
+        voiced = f0 > 0
+        midi[voiced] = 12.0 * np.log2(f0[voiced] * np.float32(1 / 440.0)) + np.float32(69.0)
+        return midi
+
+    @staticmethod
+    def normalize_to_octave(midi_notes):
+        midi_notes = np.ascontiguousarray(midi_notes, dtype=np.float32)
+        normalized = np.empty_like(midi_notes)
+        fold_midi_to_octave(midi_notes, normalized)
+        return normalized
 
-    def normalize_to_octave(self, midi_notes):
-        silence_mask = (midi_notes == 0)
-        normalized = np.where(
-            ~silence_mask,
-            ((midi_notes - 60) % 12) + 60,
-            0
-        )
+    @staticmethod
+    def f0_to_octave_midi(f0):
+        """Same as normalize_to_octave(convert_to_midi(f0)), fused into one pass."""
+        normalized = np.empty(len(f0), dtype=np.float32)
+        f0_to_norm_midi(np.ascontiguousarray(f0), normalized)
         return normalized
 
-    def get_smooth_pitch_curve(self, midi_notes):
-        silence_mask = (midi_notes == 0)
-        valid_indices = ~silence_mask
-        if np.any(valid_indices):
-            x = np.arange(len(midi_notes))
-            y = midi_notes.copy()
-            segments = np.split(y, np.where(np.diff(valid_indices))[0] + 1)
-            segment_indices = np.split(x, np.where(np.diff(valid_indices))[0] + 1)
-            smooth_curve = np.zeros_like(midi_notes)
-
-            for seg, idx in zip(segments, segment_indices):
-                if np.any(seg != 0):
-                    if len(seg) >= 5:
-                        window_length = min(5, len(seg) - 2)
-                        if window_length % 2 == 0:
-                            window_length -= 1
-                        if window_length >= 3:
-                            seg_smoothed = savgol_filter(seg, window_length, 2)
-                            smooth_curve[idx] = seg_smoothed
-                        else:
-                            smooth_curve[idx] = seg
-                    else:
-                        smooth_curve[idx] = seg
-            return smooth_curve
-        return np.zeros_like(midi_notes)
+    @staticmethod
+    def get_smooth_pitch_curve(midi_notes):
+        midi_notes = np.ascontiguousarray(midi_notes, dtype=np.float32)
+        smooth_curve = np.empty_like(midi_notes)
+        smooth_voiced_frames(midi_notes, smooth_curve)
+        return smooth_curve
 
     def calculate_curve_similarity(self, curve1, curve2):
         # Ensure curves have same length before comparison
@@ -221,33 +458,34 @@ class KaraokeScorer:
         curve1 = curve1[:min_len]
         curve2 = curve2[:min_len]
         
-        silence_mask1 = (curve1 == 0)
-        silence_mask2 = (curve2 == 0)
-        valid_mask = ~silence_mask1 & ~silence_mask2
+        ref_voiced = curve1 != 0
+        both_voiced = ref_voiced & (curve2 != 0)
+        n_both_voiced = np.count_nonzero(both_voiced)
 
-        if not np.any(valid_mask):
+        if n_both_voiced == 0:
             print("No overlapping voiced frames. Similarity = 0%.")
             return 0.0
 
-        curve1_clean = curve1[valid_mask]
-        curve2_clean = curve2[valid_mask]
+        curve1_clean = curve1[both_voiced]
+        curve2_clean = curve2[both_voiced]
 
         if len(curve1_clean) < 2 or len(curve2_clean) < 2:
             print("Not enough valid points for comparison. Similarity = 0%.")
             return 0.0
 
-        max_points = 1000
+        max_points = self.dtw_max_points
         if len(curve1_clean) > max_points:
-            step = len(curve1_clean) // max_points
-            curve1_clean = curve1_clean[::step]
-            curve2_clean = curve2_clean[::step]
+            curve1_clean = decimate_mean(curve1_clean, max_points)
+            curve2_clean = decimate_mean(curve2_clean, max_points)
+
+        radius = len(curve1_clean)
 
         try:
-            distance, _ = fastdtw(
-                curve1_clean.reshape(-1, 1),
-                curve2_clean.reshape(-1, 1),
-                dist=lambda a, b: circular_semitone_distance(a[0], b[0]),
-                radius=10
+            distance = dtw_distance(
+                np.ascontiguousarray(curve1_clean, dtype=np.float32),
+                np.ascontiguousarray(curve2_clean, dtype=np.float32),
+                radius,
+                self._dtw_rows
             )
         except Exception as e:
             print(f"Error calculating DTW distance: {e}")
@@ -256,12 +494,8 @@ class KaraokeScorer:
         max_distance = 6 * len(curve1_clean)
         raw_similarity = max(0, 100 * (1 - distance / max_distance))
 
-        ref_voiced_mask = ~silence_mask1
-        perf_voiced_mask = ~silence_mask2
-        both_voiced = ref_voiced_mask & perf_voiced_mask
-
-        overlap_fraction = (np.sum(both_voiced) / np.sum(ref_voiced_mask) 
-                          if np.sum(ref_voiced_mask) > 0 else 1.0)
+        # both_voiced is non-empty here, so the reference has voiced frames
+        overlap_fraction = n_both_voiced / np.count_nonzero(ref_voiced)
 
         min_similarity = 30
         max_similarity = 90
@@ -291,21 +525,37 @@ class KaraokeScorer:
         return final_score
 
     def estimate_shift_via_xcorr(self, ref_curve, perf_curve):
-        ref = ref_curve.astype(np.float32)
-        perf = perf_curve.astype(np.float32)
-        n = len(ref)
-        N = 1
-        while N < 2 * n:
-            N *= 2
+        from scipy.fft import rfft, irfft, next_fast_len
 
-        F_ref = rfft(ref, N)
-        F_perf = rfft(perf, N)
-        cc = irfft(F_ref * np.conjugate(F_perf), N)
-        cc = np.concatenate((cc[-(n-1):], cc[:n]))
-        shift = np.argmax(cc) - (n - 1)
-        return shift
+        ref = np.asarray(ref_curve, dtype=np.float32)
+        perf = np.asarray(perf_curve, dtype=np.float32)
+        # Too short or almost silent: no reliable peak, so skip the FFTs
+        if len(perf) < 64 or np.count_nonzero(perf) < 0.05 * len(perf):
+            return 0
+        n = len(ref)
+        N = next_fast_len(2 * n - 1, real=True)
+
+        F_ref = rfft(ref, N, workers=-1)
+        F_perf = rfft(perf, N, workers=-1)
+        # Cross-spectrum F_ref * conj(F_perf) built in place in F_perf
+        np.conjugate(F_perf, out=F_perf)
+        F_perf *= F_ref
+        cc = irfft(F_perf, N, workers=-1, overwrite_x=True)
+
+        # Lags 0..n-1 sit at the front of cc and lags -(n-1)..-1 at the back;
+        # a tie goes to the negative lag, as it comes first in lag order.
+        best = int(np.argmax(cc[:n]))
+        if n > 1:
+            neg_start = N - (n - 1)
+            best_neg = neg_start + int(np.argmax(cc[neg_start:]))
+            if cc[best_neg] >= cc[best]:
+                return best_neg - N
+        return best
 
     def record_performance(self):
+        import pygame
+        import sounddevice as sd
+
         print("\nGet ready to sing!")
         for i in range(3, 0, -1):
             print(f"{i}...")
@@ -316,29 +566,41 @@ class KaraokeScorer:
             # pygame.mixer.music.load(str(self.instrumental_path))
             # pygame.mixer.music.play()
 
-            recording = sd.rec(
-                int(self.record_duration * self.sample_rate),
+            total_samples = int(self.record_duration * self.sample_rate)
+            recording = np.empty(total_samples, dtype=np.float32)
+            write_pos = [0]
+
+            def on_audio(indata, frames, time_info, status):
+                start = write_pos[0]
+                count = min(frames, total_samples - start)
+                recording[start:start + count] = indata[:count, 0]
+                write_pos[0] = start + count
+
+            stream = sd.InputStream(
                 samplerate=self.sample_rate,
-                channels=1
+                channels=1,
+                dtype='float32',
+                blocksize=self.hop_length * 4,
+                callback=on_audio
             )
             
-            try:
-                time.sleep(self.record_duration)
-            except KeyboardInterrupt:
-                print("\nRecording stopped early!")
-                sd.stop()
-                # pygame.mixer.music.stop()
-                # pygame.mixer.quit()
-                return None  # Return None to indicate cancelled recording
+            with stream:
+                try:
+                    time.sleep(self.record_duration)
+                except KeyboardInterrupt:
+                    print("\nRecording stopped early!")
+                    # pygame.mixer.music.stop()
+                    # pygame.mixer.quit()
+                    return None  # Return None to indicate cancelled recording
             
             pygame.mixer.music.stop()
-            sd.stop()
+            recording = recording[:write_pos[0]]
             
             timestamp = time.strftime("%Y%m%d-%H%M%S")
             output_file = self.project_paths.get_recording_path(timestamp)
             sf.write(str(output_file), recording, self.sample_rate)
             
-            return recording.flatten()
+            return recording
             
         except Exception as e:
             print(f"Error during recording: {e}")
@@ -353,42 +615,39 @@ class KaraokeScorer:
         print("\nAnalyzing your performance...")
         
         try:
-            chunk_size = self.sample_rate * 10  # 10-second chunks
-            chunks = [performance_audio[i:i + chunk_size] 
-                     for i in range(0, len(performance_audio), chunk_size)]
-
-            with multiprocessing.Pool() as pool:
-                process_chunk = partial(
-                    process_audio_chunk,
-                    sr=self.sample_rate,
-                    frame_length=self.frame_length,
-                    hop_length=self.hop_length
-                )
-                results = pool.map(process_chunk, chunks)
-
-            # Combine results and handle potential errors
-            perf_f0 = np.concatenate([r[0] for r in results])
+            self._wait_for_reference_analysis()
+
+            perf_f0, _ = detect_pitch(
+                performance_audio,
+                sr=self.sample_rate,
+                frame_length=self.frame_length,
+                hop_length=self.hop_length,
+                backend=self.pitch_backend
+            )
             
-            if np.all(perf_f0 == 0):
+            if not np.any(perf_f0):
                 print("No vocal input detected.")
                 return {'melody_score': 0.0, 'final_score': 0.0}
 
-            perf_midi = self.convert_to_midi(perf_f0)
+            perf_midi_norm = self.f0_to_octave_midi(perf_f0)
             
             print("Performance f0 non-zero frames:", np.count_nonzero(perf_f0))
-            print("Performance MIDI non-zero frames:", np.count_nonzero(perf_midi))
+            print("Performance MIDI non-zero frames:", np.count_nonzero(perf_midi_norm))
 
-            perf_midi_norm = self.normalize_to_octave(perf_midi)
             perf_midi_smooth = self.get_smooth_pitch_curve(perf_midi_norm)
 
             shift_est = self.estimate_shift_via_xcorr(self.ref_midi_smooth, perf_midi_smooth)
             print(f"Estimated shift (via xcorr): {shift_est} frames")
 
-            perf_midi_shifted = np.roll(perf_midi_smooth, shift_est)
-            if shift_est > 0:
-                perf_midi_shifted[:shift_est] = 0
-            elif shift_est < 0:
-                perf_midi_shifted[shift_est:] = 0
+            n = len(perf_midi_smooth)
+            if self._perf_midi_shifted is None or len(self._perf_midi_shifted) != n:
+                self._perf_midi_shifted = np.empty(n, dtype=np.float32)
+            perf_midi_shifted = self._perf_midi_shifted
+            perf_midi_shifted.fill(0)
+            if 0 <= shift_est < n:
+                perf_midi_shifted[shift_est:] = perf_midi_smooth[:n - shift_est]
+            elif -n < shift_est < 0:
+                perf_midi_shifted[:shift_est] = perf_midi_smooth[-shift_est:]
 
             similarity_score = self.calculate_curve_similarity(
                 self.ref_midi_smooth,
@@ -401,7 +660,43 @@ class KaraokeScorer:
             print(f"Error calculating score: {e}")
             return {'melody_score': 0.0, 'final_score': 0.0}
 
+def analyze_reference_vocals(vocals_path, sample_rate, duration, frame_length, hop_length,
+                             pitch_backend, cache):
+    """Analyzes the reference vocals, stores the result in `cache` and returns it."""
+    print("Loading reference vocals...")
+    reference_audio = load_audio(vocals_path, sample_rate, duration=duration)
+
+    print("Analyzing reference pitch...")
+    ref_f0, _ = detect_pitch(
+        reference_audio,
+        sr=sample_rate,
+        frame_length=frame_length,
+        hop_length=hop_length,
+        backend=pitch_backend
+    )
+    ref_midi_norm = KaraokeScorer.f0_to_octave_midi(ref_f0)
+    reference_data = {
+        'ref_f0': ref_f0,
+        'ref_midi': KaraokeScorer.convert_to_midi(ref_f0),
+        'ref_midi_norm': ref_midi_norm,
+        'ref_midi_smooth': KaraokeScorer.get_smooth_pitch_curve(ref_midi_norm)
+    }
+    cache.cache_analysis(vocals_path, reference_data)
+    print("Reference analysis complete and cached")
+    return reference_data
+
+def _reference_analysis_worker(conn, *args):
+    """Worker process entry point: sends (reference_data, error) back over `conn`."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        conn.send((analyze_reference_vocals(*args), None))
+    except Exception as e:
+        conn.send((None, str(e)))
+    finally:
+        conn.close()
+
 def main():
+    scorer = None
     try:
         # Initialize project paths
         paths = ProjectPaths()
@@ -422,6 +717,7 @@ def main():
         if not songs[song_key]["instrumental"].exists():
             raise FileNotFoundError(f"Instrumental file not found: {songs[song_key]['instrumental']}")
         
+        _ensure_mixer()
         scorer = KaraokeScorer(
             vocals_path=songs[song_key]["vocals"],
             instrumental_path=songs[song_key]["instrumental"],
@@ -440,8 +736,12 @@ def main():
         print(f"An error occurred: {e}")
         
     finally:
+        if scorer is not None:
+            scorer.close()
+
         # Ensure pygame is properly cleaned up
         try:
+            import pygame
             pygame.mixer.quit()
             pygame.quit()
         except: